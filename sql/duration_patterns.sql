@@ -25,6 +25,12 @@ CREATE TABLE IF NOT EXISTS duration_patterns (
     pair TEXT,                             -- Trading pair (for pair-specific analysis)
     strategy TEXT,                         -- Strategy name (for strategy-specific analysis)
     
+    -- Running sums maintained by the automation system (incremental updates)
+    winning_trades INTEGER,                -- Number of profitable trades
+    sum_profit_pct REAL,                   -- Sum of profit percentages
+    n_profit_pct INTEGER,                  -- Number of non-NULL profit percentages
+    sum_trade_duration REAL,               -- Sum of trade durations in minutes
+    
     -- Indexes for performance
     UNIQUE(pattern_type, duration_category, pair, strategy)
 );
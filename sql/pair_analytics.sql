@@ -30,6 +30,13 @@ CREATE TABLE IF NOT EXISTS pair_analytics (
     sharpe_ratio REAL,                     -- Risk-adjusted return metric
     analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
     
+    -- Running sums maintained by the automation system (incremental updates)
+    sum_profit_pct REAL,                   -- Sum of profit percentages
+    n_profit_pct INTEGER,                  -- Number of non-NULL profit percentages
+    profit_pct_m2 REAL,                    -- Sum of squared deviations from the mean profit percentage
+    sum_trade_duration REAL,               -- Sum of trade durations in minutes
+    n_trade_duration INTEGER,              -- Number of non-NULL trade durations
+    
     -- Indexes for performance
     UNIQUE(pair)
 );
@@ -24,6 +24,15 @@ CREATE TABLE IF NOT EXISTS performance_rankings (
     rank_position INTEGER,                  -- Ranking position (1 = best)
     analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
     
+    -- Running sums maintained by the automation system (incremental updates)
+    winning_trades INTEGER,                 -- Number of profitable trades
+    sum_profit_ratio REAL,                  -- Sum of profit ratios
+    n_profit_ratio INTEGER,                 -- Number of non-NULL profit ratios
+    sum_profit_pct REAL,                    -- Sum of profit percentages
+    n_profit_pct INTEGER,                   -- Number of non-NULL profit percentages
+    sum_trade_duration REAL,                -- Sum of trade durations in minutes
+    n_trade_duration INTEGER,               -- Number of non-NULL trade durations
+    
     -- Indexes for performance
     UNIQUE(ranking_type, entity_name, entity_type)
 );
@@ -29,6 +29,15 @@ CREATE TABLE IF NOT EXISTS strategy_performance (
     calmar_ratio REAL,                     -- Return vs max drawdown
     analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
     
+    -- Running sums maintained by the automation system (incremental updates)
+    sum_profit_pct REAL,                   -- Sum of profit percentages
+    n_profit_pct INTEGER,                  -- Number of non-NULL profit percentages
+    profit_pct_m2 REAL,                    -- Sum of squared deviations from the mean profit percentage
+    sum_trade_duration REAL,               -- Sum of trade durations in minutes
+    n_trade_duration INTEGER,              -- Number of non-NULL trade durations
+    gross_profit_abs REAL,                 -- Sum of winning absolute profits
+    gross_loss_abs REAL,                   -- Sum of losing absolute profits (positive)
+    
     -- Indexes for performance
     UNIQUE(strategy_name)
 );
@@ -29,6 +29,14 @@ CREATE TABLE IF NOT EXISTS timing_analysis (
     month_of_year INTEGER,                 -- Month (1-12)
     time_period_name TEXT,                 -- Human readable time period name
     
+    -- Running sums maintained by the automation system (incremental updates)
+    winning_trades INTEGER,                -- Number of profitable trades
+    sum_profit_pct REAL,                   -- Sum of profit percentages
+    n_profit_pct INTEGER,                  -- Number of non-NULL profit percentages
+    profit_pct_m2 REAL,                    -- Sum of squared deviations from the mean profit percentage
+    sum_trade_duration REAL,               -- Sum of trade durations in minutes
+    n_trade_duration INTEGER,              -- Number of non-NULL trade durations
+    
     -- Indexes for performance
     UNIQUE(time_category, hour_of_day, day_of_week, day_of_month, month_of_year)
 );
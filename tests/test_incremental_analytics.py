@@ -0,0 +1,259 @@
+"""Incremental analytics must match a full recompute over the same trades"""
+
+import glob
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from trading_analytics_automation_final import TradingAnalyticsAutomator
+
+# Analytics tables and the natural key to order their rows by
+ANALYTICS_TABLES = {
+    'performance_rankings': 'ranking_type, entity_name',
+    'risk_metrics': 'metric_type',
+    'strategy_performance': 'strategy_name',
+    'timing_analysis': 'time_category, hour_of_day, day_of_week',
+    'pair_analytics': 'pair',
+    'stop_loss_analytics': 'analysis_type, pair',
+    'duration_patterns': 'pattern_type, duration_category',
+    'bot_health_metrics': 'metric_name',
+}
+
+# Columns that differ between equivalent runs
+IGNORED_COLUMNS = {'id', 'analysis_date', 'last_calculation'}
+
+PAIRS = ['BTC/USDT', 'ETH/USDT', 'ADA/USDT', 'DOT/USDT', 'SOL/BTC']
+STRATEGIES = ['S1', 'S2', 'S3']
+EXIT_REASONS = ['roi', 'stop_loss', 'exit_signal', 'force_exit']
+
+
+def create_database(path):
+    """Create the trades, snapshot and analytics tables from the sql/ scripts"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE trades (
+            trade_id INTEGER PRIMARY KEY, pair TEXT NOT NULL, base_currency TEXT NOT NULL,
+            quote_currency TEXT NOT NULL, is_open BOOLEAN NOT NULL, strategy TEXT NOT NULL,
+            profit_pct REAL, profit_abs REAL, profit_ratio REAL, trade_duration INTEGER,
+            exit_reason TEXT, stop_loss_pct REAL, stake_amount REAL,
+            open_date DATETIME, close_date DATETIME
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE analysis_snapshots (
+            id INTEGER PRIMARY KEY, snapshot_type TEXT, records_processed INTEGER,
+            status TEXT, last_trade_id INTEGER, last_analysis_run DATETIME, error_message TEXT
+        )
+    """)
+    for sql_file in sorted(glob.glob(os.path.join(REPO_ROOT, 'sql', '*.sql'))):
+        statement = ''
+        with open(sql_file) as f:
+            for line in f:
+                if line.lstrip().startswith('--'):
+                    continue
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    if statement.strip().upper().startswith('CREATE TABLE'):
+                        conn.execute(statement)
+                    statement = ''
+    conn.commit()
+    conn.close()
+
+
+class TestIncrementalAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'trades.db')
+        create_database(self.db_path)
+        self.rng = random.Random(7)
+        self.next_trade_id = 1
+        self.automators = []
+
+    def tearDown(self):
+        for automator in self.automators:
+            try:
+                automator.close()
+            except sqlite3.ProgrammingError:
+                pass
+        self.tmp.cleanup()
+
+    def start_automator(self, path=None):
+        automator = TradingAnalyticsAutomator(path or self.db_path)
+        self.automators.append(automator)
+        return automator
+
+    def add_trades(self, count, open_count=0):
+        """Insert closed trades, the last open_count of them still open, and return those ids"""
+        base = datetime(2026, 1, 1)
+        open_ids = []
+        conn = sqlite3.connect(self.db_path)
+        for i in range(count):
+            trade_id = self.next_trade_id
+            self.next_trade_id += 1
+            pair = self.rng.choice(PAIRS)
+            is_open = i >= count - open_count
+            profit_pct = round(self.rng.uniform(-5, 5), 4)
+            open_date = base + timedelta(hours=self.rng.randint(0, 2000), minutes=self.rng.randint(0, 59))
+            trade_duration = self.rng.randint(5, 3000)
+            # Every kind of NULL the analytics have to skip
+            if trade_id % 17 == 3:
+                profit_pct = None
+            if trade_id % 13 == 5:
+                trade_duration = None
+            conn.execute("INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                trade_id, pair, *pair.split('/'), int(is_open), self.rng.choice(STRATEGIES),
+                profit_pct, None if profit_pct is None else profit_pct * 10,
+                None if profit_pct is None else profit_pct / 100, trade_duration,
+                self.rng.choice(EXIT_REASONS), -2.0 if self.rng.random() < 0.8 else None, 100.0,
+                None if trade_id % 29 == 7 else open_date.strftime('%Y-%m-%d %H:%M:%S'),
+                (open_date + timedelta(hours=3)).strftime('%Y-%m-%d %H:%M:%S'),
+            ))
+            if is_open:
+                open_ids.append(trade_id)
+        conn.commit()
+        conn.close()
+        return open_ids
+
+    def close_trades(self, trade_ids):
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany("UPDATE trades SET is_open = 0 WHERE trade_id = ?", [(i,) for i in trade_ids])
+        conn.commit()
+        conn.close()
+
+    def execute(self, sql):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    def dump_analytics(self, path):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        tables = {}
+        for table, order in ANALYTICS_TABLES.items():
+            tables[table] = [
+                {k: row[k] for k in row.keys() if k not in IGNORED_COLUMNS}
+                for row in conn.execute(f"SELECT * FROM {table} ORDER BY {order}")
+            ]
+        conn.close()
+        return tables
+
+    def full_recompute(self):
+        """Run a fresh automator once over a copy of the current trades"""
+        path = os.path.join(self.tmp.name, 'full.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        create_database(path)
+        conn = sqlite3.connect(path)
+        conn.execute("ATTACH DATABASE ? AS source", (self.db_path,))
+        conn.execute("INSERT INTO trades SELECT * FROM source.trades")
+        conn.commit()
+        conn.close()
+
+        automator = self.start_automator(path)
+        automator.run_scheduled_analysis()
+        automator.close()
+        return self.dump_analytics(path)
+
+    def assertMatchesFullRecompute(self):
+        actual = self.dump_analytics(self.db_path)
+        expected = self.full_recompute()
+        for table in ANALYTICS_TABLES:
+            self.assertEqual(len(actual[table]), len(expected[table]), table)
+            for actual_row, expected_row in zip(actual[table], expected[table]):
+                for column, value in expected_row.items():
+                    if isinstance(value, float) and actual_row[column] is not None:
+                        self.assertTrue(
+                            math.isclose(actual_row[column], value, rel_tol=1e-9, abs_tol=1e-9),
+                            f"{table}.{column}: {actual_row[column]} != {value}")
+                    else:
+                        self.assertEqual(actual_row[column], value, f"{table}.{column}")
+
+    def test_cycles_with_pending_trades(self):
+        open_ids = self.add_trades(150, open_count=12)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+        # Trades below the watermark close after it has moved past them
+        self.close_trades(open_ids[:6])
+        self.add_trades(60, open_count=4)
+        automator.run_scheduled_analysis()
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+        self.close_trades(open_ids[6:])
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+    def test_restart(self):
+        open_ids = self.add_trades(120, open_count=10)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+        automator.close()
+
+        self.close_trades(open_ids)
+        self.add_trades(40)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+    def test_failed_cycle_is_retried(self):
+        self.add_trades(100, open_count=5)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+
+        self.add_trades(30)
+        with mock.patch.object(automator, 'update_bot_health_metrics',
+                               side_effect=sqlite3.OperationalError('disk I/O error')):
+            automator.run_scheduled_analysis()
+        conn = sqlite3.connect(self.db_path)
+        status = conn.execute("SELECT status FROM analysis_snapshots ORDER BY id DESC LIMIT 1").fetchone()[0]
+        conn.close()
+        self.assertEqual(status, 'failed')
+
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+    def test_another_automator_on_the_same_database(self):
+        open_ids = self.add_trades(120, open_count=10)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+
+        # A one-shot run while production is up
+        self.close_trades(open_ids[:5])
+        self.add_trades(40)
+        one_shot = self.start_automator()
+        one_shot.run_scheduled_analysis()
+        one_shot.close()
+
+        self.close_trades(open_ids[5:])
+        self.add_trades(20)
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+    def test_tables_reset_by_sql_scripts(self):
+        self.add_trades(120)
+        automator = self.start_automator()
+        automator.run_scheduled_analysis()
+
+        # What the maintenance sections of sql/*.sql do
+        self.execute("DELETE FROM pair_analytics")
+        self.execute("DELETE FROM timing_analysis")
+        self.add_trades(20)
+        automator.run_scheduled_analysis()
+        self.assertMatchesFullRecompute()
+
+
+if __name__ == '__main__':
+    unittest.main()
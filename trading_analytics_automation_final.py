@@ -4,13 +4,22 @@ Real-time Trading Analytics Automation System
 Automatically updates your 8 analytics categories when trades complete
 """
 
+import heapq
 import sqlite3
+import threading
 import time
 import logging
+import math
 from datetime import datetime
-import schedule
+import numpy as np
 import os
 
+try:
+    from numba import njit
+except ImportError:
+    # Optional: without Numba the drawdown falls back to NumPy
+    njit = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,407 +30,1233 @@ logging.basicConfig(
     ]
 )
 
+# Running sums kept next to the derived metrics so the incremental
+# categories can be updated from new trades only; each n_<column> counts
+# the non-NULL values behind sum_<column>, so averages skip NULLs like AVG()
+INCREMENTAL_STATE_COLUMNS = {
+    'performance_rankings': {
+        'winning_trades': 'INTEGER',
+        'sum_profit_ratio': 'REAL',
+        'n_profit_ratio': 'INTEGER',
+        'sum_profit_pct': 'REAL',
+        'n_profit_pct': 'INTEGER',
+        'sum_trade_duration': 'REAL',
+        'n_trade_duration': 'INTEGER',
+    },
+    'pair_analytics': {
+        'sum_profit_pct': 'REAL',
+        'n_profit_pct': 'INTEGER',
+        'profit_pct_m2': 'REAL',
+        'sum_trade_duration': 'REAL',
+        'n_trade_duration': 'INTEGER',
+    },
+    'strategy_performance': {
+        'sum_profit_pct': 'REAL',
+        'n_profit_pct': 'INTEGER',
+        'profit_pct_m2': 'REAL',
+        'sum_trade_duration': 'REAL',
+        'n_trade_duration': 'INTEGER',
+        'gross_profit_abs': 'REAL',
+        'gross_loss_abs': 'REAL',
+    },
+    'timing_analysis': {
+        'winning_trades': 'INTEGER',
+        'sum_profit_pct': 'REAL',
+        'n_profit_pct': 'INTEGER',
+        'profit_pct_m2': 'REAL',
+        'sum_trade_duration': 'REAL',
+        'n_trade_duration': 'INTEGER',
+    },
+    'duration_patterns': {
+        'winning_trades': 'INTEGER',
+        'sum_profit_pct': 'REAL',
+        'n_profit_pct': 'INTEGER',
+        'sum_trade_duration': 'REAL',
+    },
+}
+
+# Oldest SQLite library the category SQL runs on: the ranking update
+# uses UPDATE ... FROM, added in 3.33
+MIN_SQLITE_VERSION = (3, 33, 0)
+
+# Page cache per connection (KiB) and memory-mapped I/O window (bytes);
+# the mmap window only reserves address space, pages are shared with the OS cache
+CACHE_SIZE_KIB = 65536
+MMAP_SIZE_BYTES = 1024 * 1024 * 1024
+
+# How often to look for commits from other connections (the trading bot)
+DATA_VERSION_POLL_SECONDS = 1
+
+# Minimum gap between change-triggered analyses so bursty inserts don't thrash
+MIN_ANALYSIS_INTERVAL_SECONDS = 5
+
+# Number of most recent analysis snapshots kept by the daily retention job
+SNAPSHOT_RETENTION_COUNT = 1000
+
+# Periods of the recurring jobs run by start_automation
+ANALYSIS_INTERVAL_SECONDS = 5 * 60
+HEALTH_CHECK_INTERVAL_SECONDS = 60 * 60
+SNAPSHOT_PRUNE_INTERVAL_SECONDS = 24 * 60 * 60
+
+# max_drawdown(returns): deepest fall of the cumulative return curve below
+# its running peak, starting from a flat equity of 0
+if njit is not None:
+    # One fused pass instead of NumPy's cumsum, running maximum and
+    # difference temporaries; the explicit signature compiles at import and
+    # cache=True keeps the machine code between runs
+    @njit('float64(float64[:])', cache=True)
+    def max_drawdown(returns):
+        """Track equity, peak and drawdown in a single compiled loop"""
+        equity = 0.0
+        peak = 0.0
+        drawdown = 0.0
+        for value in returns:
+            equity += value
+            if equity > peak:
+                peak = equity
+            elif equity - peak < drawdown:
+                drawdown = equity - peak
+        return drawdown
+else:
+    def max_drawdown(returns):
+        """Compare the NumPy cumulative sum with its running maximum"""
+        equity = np.concatenate(([0.0], returns.cumsum()))
+        return float((equity - np.maximum.accumulate(equity)).min())
+
+def sql_sqrt(value):
+    """SQRT() for SQLite builds without the math functions, NULL where theirs is"""
+    if value is None or value < 0:
+        return None
+    return math.sqrt(value)
+
+# SQL for the analytics categories, kept at module level so every cycle
+# binds the same statement text from the connection's statement cache
+
+SQL_SELECT_CLOSED_TRADE_SERIES = """
+    SELECT 
+        profit_pct,
+        profit_abs,
+        trade_duration,
+        exit_reason = 'stop_loss' as is_stop_loss
+    FROM trades WHERE is_open = 0
+    ORDER BY close_date, trade_id
+"""
+
+SQL_STAGE_PAIR_DELTAS = """
+    CREATE TEMP TABLE new_pair_deltas AS
+    SELECT 
+        pair,
+        -- Constant per pair, so group on pair alone
+        MAX(base_currency) as base_currency,
+        MAX(quote_currency) as quote_currency,
+        COUNT(*) as trade_count,
+        SUM(is_win) as winning_trades,
+        SUM(CASE WHEN profit_pct <= 0 THEN 1 ELSE 0 END) as losing_trades,
+        TOTAL(profit_abs) as sum_profit_abs,
+        TOTAL(profit_pct) as sum_profit_pct,
+        COUNT(profit_pct) as n_profit_pct,
+        TOTAL(profit_pct_dev * profit_pct_dev) as profit_pct_m2,
+        TOTAL(profit_ratio) as sum_profit_ratio,
+        COUNT(profit_ratio) as n_profit_ratio,
+        TOTAL(trade_duration) as sum_trade_duration,
+        COUNT(trade_duration) as n_trade_duration,
+        TOTAL(stake_amount) as total_volume,
+        MAX(profit_pct) as max_profit_pct,
+        MIN(profit_pct) as min_profit_pct
+    FROM (
+        -- Deviations from the batch mean give a stable sum of squares to
+        -- merge; NULL profits have no deviation and are left out like AVG()
+        SELECT *, profit_pct - AVG(profit_pct) OVER (PARTITION BY pair) as profit_pct_dev
+        FROM new_closed_trades
+    )
+    GROUP BY pair
+"""
+
+SQL_MERGE_PERFORMANCE_RANKINGS = """
+    INSERT INTO performance_rankings (
+        ranking_type, entity_name, entity_type, profit_abs,
+        trade_count, winning_trades, max_profit_pct, min_profit_pct,
+        total_volume, sum_profit_ratio, n_profit_ratio, sum_profit_pct,
+        n_profit_pct, sum_trade_duration, n_trade_duration, analysis_date
+    )
+    SELECT 
+        'by_pair' as ranking_type,
+        pair as entity_name,
+        'trading_pair' as entity_type,
+        sum_profit_abs as profit_abs,
+        trade_count,
+        winning_trades,
+        max_profit_pct,
+        min_profit_pct,
+        total_volume,
+        sum_profit_ratio,
+        n_profit_ratio,
+        sum_profit_pct,
+        n_profit_pct,
+        sum_trade_duration,
+        n_trade_duration,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM new_pair_deltas 
+    WHERE true  -- Lets the parser tell ON CONFLICT from a join constraint
+    ON CONFLICT(ranking_type, entity_name, entity_type) DO UPDATE SET
+        profit_abs = profit_abs + excluded.profit_abs,
+        trade_count = trade_count + excluded.trade_count,
+        winning_trades = winning_trades + excluded.winning_trades,
+        max_profit_pct = MAX(max_profit_pct, excluded.max_profit_pct),
+        min_profit_pct = MIN(min_profit_pct, excluded.min_profit_pct),
+        total_volume = total_volume + excluded.total_volume,
+        sum_profit_ratio = sum_profit_ratio + excluded.sum_profit_ratio,
+        n_profit_ratio = n_profit_ratio + excluded.n_profit_ratio,
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration,
+        n_trade_duration = n_trade_duration + excluded.n_trade_duration
+"""
+
+SQL_DERIVE_PERFORMANCE_RANKINGS = """
+    UPDATE performance_rankings SET
+        profit_ratio = sum_profit_ratio / n_profit_ratio,
+        profit_pct = sum_profit_pct / n_profit_pct,
+        win_rate = winning_trades * 1.0 / trade_count,
+        avg_duration_minutes = sum_trade_duration / n_trade_duration,
+        analysis_date = CURRENT_TIMESTAMP
+    WHERE ranking_type = 'by_pair'
+      AND entity_name IN (SELECT pair FROM new_pair_deltas)
+"""
+
+SQL_RANK_PERFORMANCE_RANKINGS = """
+    UPDATE performance_rankings SET rank_position = ranked.rank_position
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY profit_pct DESC) as rank_position
+        FROM performance_rankings 
+        WHERE ranking_type = 'by_pair'
+    ) AS ranked
+    WHERE performance_rankings.id = ranked.id
+      AND performance_rankings.rank_position IS NOT ranked.rank_position
+"""
+
+SQL_UPSERT_RISK_METRICS = """
+    INSERT INTO risk_metrics (
+        metric_type, stop_loss_triggered_count, 
+        stop_loss_effectiveness_pct, sharpe_ratio,
+        max_drawdown_pct, analysis_date
+    ) VALUES ('overall', ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(metric_type) WHERE entity_name IS NULL DO UPDATE SET
+        stop_loss_triggered_count = excluded.stop_loss_triggered_count,
+        stop_loss_effectiveness_pct = excluded.stop_loss_effectiveness_pct,
+        sharpe_ratio = excluded.sharpe_ratio,
+        max_drawdown_pct = excluded.max_drawdown_pct,
+        analysis_date = excluded.analysis_date
+"""
+
+SQL_MERGE_STRATEGY_PERFORMANCE = """
+    INSERT INTO strategy_performance (
+        strategy_name, total_trades, winning_trades, losing_trades,
+        total_profit_abs, best_trade_pct, worst_trade_pct,
+        sum_profit_pct, n_profit_pct, profit_pct_m2, sum_trade_duration,
+        n_trade_duration, gross_profit_abs, gross_loss_abs, analysis_date
+    )
+    SELECT 
+        strategy as strategy_name,
+        COUNT(*) as total_trades,
+        SUM(is_win) as winning_trades,
+        SUM(CASE WHEN profit_pct <= 0 THEN 1 ELSE 0 END) as losing_trades,
+        TOTAL(profit_abs) as total_profit_abs,
+        MAX(profit_pct) as best_trade_pct,
+        MIN(profit_pct) as worst_trade_pct,
+        TOTAL(profit_pct) as sum_profit_pct,
+        COUNT(profit_pct) as n_profit_pct,
+        TOTAL(profit_pct_dev * profit_pct_dev) as profit_pct_m2,
+        TOTAL(trade_duration) as sum_trade_duration,
+        COUNT(trade_duration) as n_trade_duration,
+        TOTAL(CASE WHEN profit_abs > 0 THEN profit_abs ELSE 0 END) as gross_profit_abs,
+        TOTAL(CASE WHEN profit_abs < 0 THEN ABS(profit_abs) ELSE 0 END) as gross_loss_abs,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM (
+        SELECT *, profit_pct - AVG(profit_pct) OVER (PARTITION BY strategy) as profit_pct_dev
+        FROM new_closed_trades
+    )
+    GROUP BY strategy
+    ON CONFLICT(strategy_name) DO UPDATE SET
+        total_trades = total_trades + excluded.total_trades,
+        winning_trades = winning_trades + excluded.winning_trades,
+        losing_trades = losing_trades + excluded.losing_trades,
+        total_profit_abs = total_profit_abs + excluded.total_profit_abs,
+        best_trade_pct = MAX(best_trade_pct, excluded.best_trade_pct),
+        worst_trade_pct = MIN(worst_trade_pct, excluded.worst_trade_pct),
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        profit_pct_m2 = profit_pct_m2 + excluded.profit_pct_m2
+            -- Chan et al. pairwise update; SET reads the pre-update values
+            + CASE WHEN n_profit_pct > 0 AND excluded.n_profit_pct > 0 THEN
+                (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * n_profit_pct * excluded.n_profit_pct / (n_profit_pct + excluded.n_profit_pct)
+              ELSE 0 END,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration,
+        n_trade_duration = n_trade_duration + excluded.n_trade_duration,
+        gross_profit_abs = gross_profit_abs + excluded.gross_profit_abs,
+        gross_loss_abs = gross_loss_abs + excluded.gross_loss_abs
+"""
+
+SQL_DERIVE_STRATEGY_PERFORMANCE = """
+    UPDATE strategy_performance SET
+        win_rate = winning_trades * 1.0 / total_trades,
+        avg_profit_pct = sum_profit_pct / n_profit_pct,
+        profit_factor = CASE 
+            WHEN gross_loss_abs > 0 THEN gross_profit_abs / gross_loss_abs
+            ELSE 0
+        END,
+        expectancy = (sum_profit_pct / n_profit_pct) * (winning_trades * 1.0 / total_trades),
+        -- 1 / (1 + coefficient of variation): 1 for identical returns, towards 0 as they scatter
+        consistency_score = CASE 
+            WHEN n_profit_pct > 1 AND sum_profit_pct != 0
+            THEN 1 / (1 + SQRT(profit_pct_m2 / n_profit_pct) / ABS(sum_profit_pct / n_profit_pct))
+            ELSE 0
+        END,
+        avg_trade_duration_minutes = sum_trade_duration / n_trade_duration,
+        analysis_date = CURRENT_TIMESTAMP
+    WHERE strategy_name IN (SELECT strategy FROM new_closed_trades)
+"""
+
+SQL_MERGE_TIMING_HOURLY = """
+    INSERT INTO timing_analysis (
+        time_category, hour_of_day, time_period_name, trade_count,
+        winning_trades, sum_profit_pct, n_profit_pct, profit_pct_m2,
+        total_profit_abs, sum_trade_duration, n_trade_duration, analysis_date
+    )
+    SELECT 
+        'hourly' as time_category,
+        hour_of_day,
+        CASE 
+            WHEN hour_of_day BETWEEN 0 AND 5 THEN 'Early Morning (0-5)'
+            WHEN hour_of_day BETWEEN 6 AND 11 THEN 'Morning (6-11)'
+            WHEN hour_of_day BETWEEN 12 AND 17 THEN 'Afternoon (12-17)'
+            WHEN hour_of_day BETWEEN 18 AND 23 THEN 'Evening (18-23)'
+        END as time_period_name,
+        COUNT(*) as trade_count,
+        SUM(is_win) as winning_trades,
+        TOTAL(profit_pct) as sum_profit_pct,
+        COUNT(profit_pct) as n_profit_pct,
+        TOTAL(profit_pct_dev * profit_pct_dev) as profit_pct_m2,
+        TOTAL(profit_abs) as total_profit_abs,
+        TOTAL(trade_duration) as sum_trade_duration,
+        COUNT(trade_duration) as n_trade_duration,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM (
+        -- Deviations from the hour's batch mean for a stable sum of squares
+        SELECT *, profit_pct - AVG(profit_pct) OVER (PARTITION BY hour_of_day) as profit_pct_dev
+        FROM new_closed_trades 
+        WHERE hour_of_day IS NOT NULL
+    )
+    GROUP BY hour_of_day
+    ON CONFLICT(time_category, hour_of_day) 
+        WHERE day_of_week IS NULL AND day_of_month IS NULL AND month_of_year IS NULL 
+    DO UPDATE SET
+        trade_count = trade_count + excluded.trade_count,
+        winning_trades = winning_trades + excluded.winning_trades,
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        profit_pct_m2 = profit_pct_m2 + excluded.profit_pct_m2
+            -- Chan et al. pairwise update of the sum of squared deviations
+            + CASE WHEN n_profit_pct > 0 AND excluded.n_profit_pct > 0 THEN
+                (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * n_profit_pct * excluded.n_profit_pct / (n_profit_pct + excluded.n_profit_pct)
+              ELSE 0 END,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        total_profit_abs = total_profit_abs + excluded.total_profit_abs,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration,
+        n_trade_duration = n_trade_duration + excluded.n_trade_duration
+"""
+
+SQL_MERGE_TIMING_DAILY = """
+    INSERT INTO timing_analysis (
+        time_category, day_of_week, time_period_name, trade_count,
+        winning_trades, sum_profit_pct, n_profit_pct, profit_pct_m2,
+        total_profit_abs, sum_trade_duration, n_trade_duration, analysis_date
+    )
+    SELECT 
+        'daily' as time_category,
+        day_of_week,
+        CASE day_of_week
+            WHEN 0 THEN 'Sunday'
+            WHEN 1 THEN 'Monday'
+            WHEN 2 THEN 'Tuesday'
+            WHEN 3 THEN 'Wednesday'
+            WHEN 4 THEN 'Thursday'
+            WHEN 5 THEN 'Friday'
+            WHEN 6 THEN 'Saturday'
+        END as time_period_name,
+        COUNT(*) as trade_count,
+        SUM(is_win) as winning_trades,
+        TOTAL(profit_pct) as sum_profit_pct,
+        COUNT(profit_pct) as n_profit_pct,
+        TOTAL(profit_pct_dev * profit_pct_dev) as profit_pct_m2,
+        TOTAL(profit_abs) as total_profit_abs,
+        TOTAL(trade_duration) as sum_trade_duration,
+        COUNT(trade_duration) as n_trade_duration,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM (
+        SELECT *, profit_pct - AVG(profit_pct) OVER (PARTITION BY day_of_week) as profit_pct_dev
+        FROM new_closed_trades 
+        WHERE day_of_week IS NOT NULL
+    )
+    GROUP BY day_of_week
+    ON CONFLICT(time_category, day_of_week) 
+        WHERE hour_of_day IS NULL AND day_of_month IS NULL AND month_of_year IS NULL 
+    DO UPDATE SET
+        trade_count = trade_count + excluded.trade_count,
+        winning_trades = winning_trades + excluded.winning_trades,
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        profit_pct_m2 = profit_pct_m2 + excluded.profit_pct_m2
+            + CASE WHEN n_profit_pct > 0 AND excluded.n_profit_pct > 0 THEN
+                (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * n_profit_pct * excluded.n_profit_pct / (n_profit_pct + excluded.n_profit_pct)
+              ELSE 0 END,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        total_profit_abs = total_profit_abs + excluded.total_profit_abs,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration,
+        n_trade_duration = n_trade_duration + excluded.n_trade_duration
+"""
+
+SQL_DERIVE_TIMING_BREAKDOWNS = """
+    UPDATE timing_analysis SET
+        win_rate = winning_trades * 1.0 / trade_count,
+        avg_profit_pct = sum_profit_pct / n_profit_pct,
+        duration_minutes_avg = sum_trade_duration / n_trade_duration,
+        volatility_pct = CASE 
+            WHEN trade_count > 1
+            THEN SQRT(profit_pct_m2 / n_profit_pct)
+            ELSE 0
+        END,
+        analysis_date = CURRENT_TIMESTAMP
+    WHERE time_category IN ('hourly', 'daily')
+"""
+
+SQL_SELECT_TIMING_SUMMARY = """
+    SELECT 
+        COALESCE((SELECT hour_of_day FROM timing_analysis WHERE time_category = 'hourly'
+                  ORDER BY avg_profit_pct DESC, hour_of_day LIMIT 1), 0) as best_hour,
+        COALESCE((SELECT hour_of_day FROM timing_analysis WHERE time_category = 'hourly'
+                  ORDER BY avg_profit_pct ASC, hour_of_day LIMIT 1), 0) as worst_hour,
+        COALESCE((SELECT SUM(sum_profit_pct) / SUM(n_profit_pct) FROM timing_analysis 
+                  WHERE time_category = 'daily' AND day_of_week IN (0, 6)), 0.0) as weekend_perf,
+        COALESCE((SELECT SUM(sum_profit_pct) / SUM(n_profit_pct) FROM timing_analysis 
+                  WHERE time_category = 'daily' AND day_of_week NOT IN (0, 6)), 0.0) as weekday_perf
+"""
+
+SQL_UPSERT_TIMING_ANALYSIS = """
+    INSERT INTO timing_analysis (
+        time_category, trade_count, win_rate, avg_profit_pct,
+        total_profit_abs, best_performance_hour, worst_performance_hour,
+        weekend_performance_pct, weekday_performance_pct,
+        duration_minutes_avg, analysis_date
+    ) VALUES ('overall', ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(time_category) 
+        WHERE hour_of_day IS NULL AND day_of_week IS NULL 
+        AND day_of_month IS NULL AND month_of_year IS NULL 
+    DO UPDATE SET
+        trade_count = excluded.trade_count,
+        win_rate = excluded.win_rate,
+        avg_profit_pct = excluded.avg_profit_pct,
+        total_profit_abs = excluded.total_profit_abs,
+        best_performance_hour = excluded.best_performance_hour,
+        worst_performance_hour = excluded.worst_performance_hour,
+        weekend_performance_pct = excluded.weekend_performance_pct,
+        weekday_performance_pct = excluded.weekday_performance_pct,
+        duration_minutes_avg = excluded.duration_minutes_avg,
+        analysis_date = excluded.analysis_date
+"""
+
+SQL_MERGE_PAIR_ANALYTICS = """
+    INSERT INTO pair_analytics (
+        pair, base_currency, quote_currency, total_trades, 
+        winning_trades, losing_trades, total_profit_abs,
+        sum_profit_pct, n_profit_pct, profit_pct_m2, sum_trade_duration,
+        n_trade_duration, analysis_date
+    )
+    SELECT 
+        pair,
+        base_currency,
+        quote_currency,
+        trade_count as total_trades,
+        winning_trades,
+        losing_trades,
+        sum_profit_abs as total_profit_abs,
+        sum_profit_pct,
+        n_profit_pct,
+        profit_pct_m2,
+        sum_trade_duration,
+        n_trade_duration,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM new_pair_deltas 
+    WHERE true  -- Lets the parser tell ON CONFLICT from a join constraint
+    ON CONFLICT(pair) DO UPDATE SET
+        total_trades = total_trades + excluded.total_trades,
+        winning_trades = winning_trades + excluded.winning_trades,
+        losing_trades = losing_trades + excluded.losing_trades,
+        total_profit_abs = total_profit_abs + excluded.total_profit_abs,
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        profit_pct_m2 = profit_pct_m2 + excluded.profit_pct_m2
+            -- Chan et al. pairwise update of the sum of squared deviations
+            + CASE WHEN n_profit_pct > 0 AND excluded.n_profit_pct > 0 THEN
+                (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * (excluded.sum_profit_pct / excluded.n_profit_pct - sum_profit_pct / n_profit_pct)
+                * n_profit_pct * excluded.n_profit_pct / (n_profit_pct + excluded.n_profit_pct)
+              ELSE 0 END,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration,
+        n_trade_duration = n_trade_duration + excluded.n_trade_duration
+"""
+
+SQL_DERIVE_PAIR_ANALYTICS = """
+    UPDATE pair_analytics SET
+        win_rate = winning_trades * 1.0 / total_trades,
+        avg_profit_pct = sum_profit_pct / n_profit_pct,
+        avg_trade_duration_minutes = sum_trade_duration / n_trade_duration,
+        price_volatility_pct = CASE 
+            WHEN total_trades > 1
+            THEN SQRT(profit_pct_m2 / n_profit_pct)
+            ELSE 0
+        END,
+        analysis_date = CURRENT_TIMESTAMP
+    WHERE pair IN (SELECT pair FROM new_pair_deltas)
+"""
+
+SQL_UPSERT_STOP_LOSS_ANALYTICS = """
+    INSERT INTO stop_loss_analytics (
+        analysis_type, pair, stop_loss_level_pct, total_trades_with_sl,
+        sl_triggered_count, sl_effectiveness_pct, 
+        avg_loss_when_triggered_pct, avg_profit_when_not_triggered_pct,
+        analysis_date
+    )
+    WITH per_pair AS (
+        -- Each conditional sum once per pair, reused by the ratio below
+        SELECT 
+            pair,
+            AVG(stop_loss_pct) as stop_loss_level_pct,
+            COUNT(*) as total_trades_with_sl,
+            SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END) as sl_triggered_count,
+            SUM(CASE WHEN exit_reason = 'stop_loss' AND profit_pct > -10 THEN 1 ELSE 0 END) as sl_effective_count,
+            AVG(CASE WHEN exit_reason = 'stop_loss' THEN profit_pct ELSE NULL END) as avg_loss_when_triggered_pct,
+            AVG(CASE WHEN exit_reason != 'stop_loss' THEN profit_pct ELSE NULL END) as avg_profit_when_not_triggered_pct
+        FROM trades 
+        WHERE is_open = 0 AND stop_loss_pct IS NOT NULL
+          AND pair IN (SELECT pair FROM new_closed_trades)
+        GROUP BY pair
+    )
+    SELECT 
+        'by_pair' as analysis_type,
+        pair,
+        stop_loss_level_pct,
+        total_trades_with_sl,
+        sl_triggered_count,
+        CASE 
+            WHEN sl_triggered_count > 0
+            THEN (sl_effective_count * 1.0 / sl_triggered_count) * 100
+            ELSE 0
+        END as sl_effectiveness_pct,
+        avg_loss_when_triggered_pct,
+        avg_profit_when_not_triggered_pct,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM per_pair 
+    WHERE true  -- Lets the parser tell ON CONFLICT from a join constraint
+    ON CONFLICT(analysis_type, pair) WHERE strategy IS NULL DO UPDATE SET
+        stop_loss_level_pct = excluded.stop_loss_level_pct,
+        total_trades_with_sl = excluded.total_trades_with_sl,
+        sl_triggered_count = excluded.sl_triggered_count,
+        sl_effectiveness_pct = excluded.sl_effectiveness_pct,
+        avg_loss_when_triggered_pct = excluded.avg_loss_when_triggered_pct,
+        avg_profit_when_not_triggered_pct = excluded.avg_profit_when_not_triggered_pct,
+        analysis_date = excluded.analysis_date
+"""
+
+SQL_MERGE_DURATION_PATTERNS = """
+    INSERT INTO duration_patterns (
+        pattern_type, duration_category, min_duration_minutes, 
+        max_duration_minutes, trade_count, winning_trades, sum_profit_pct,
+        n_profit_pct, total_profit_abs, sum_trade_duration, analysis_date
+    )
+    WITH bucketed AS (
+        SELECT 
+            trade_duration,
+            profit_pct,
+            profit_abs,
+            is_win,
+            CASE 
+                WHEN trade_duration <= 60 THEN 'scalp'
+                WHEN trade_duration <= 480 THEN 'short_term'  
+                WHEN trade_duration <= 1440 THEN 'day_trade'
+                ELSE 'swing_trade'
+            END as duration_category
+        FROM new_closed_trades 
+        WHERE trade_duration IS NOT NULL
+    )
+    SELECT 
+        'duration_based' as pattern_type,
+        duration_category,
+        MIN(trade_duration) as min_duration_minutes,
+        MAX(trade_duration) as max_duration_minutes,
+        COUNT(*) as trade_count,
+        SUM(is_win) as winning_trades,
+        TOTAL(profit_pct) as sum_profit_pct,
+        COUNT(profit_pct) as n_profit_pct,
+        TOTAL(profit_abs) as total_profit_abs,
+        TOTAL(trade_duration) as sum_trade_duration,
+        CURRENT_TIMESTAMP as analysis_date
+    FROM bucketed 
+    GROUP BY duration_category
+    ON CONFLICT(pattern_type, duration_category) WHERE pair IS NULL AND strategy IS NULL DO UPDATE SET
+        min_duration_minutes = MIN(min_duration_minutes, excluded.min_duration_minutes),
+        max_duration_minutes = MAX(max_duration_minutes, excluded.max_duration_minutes),
+        trade_count = trade_count + excluded.trade_count,
+        winning_trades = winning_trades + excluded.winning_trades,
+        sum_profit_pct = sum_profit_pct + excluded.sum_profit_pct,
+        n_profit_pct = n_profit_pct + excluded.n_profit_pct,
+        total_profit_abs = total_profit_abs + excluded.total_profit_abs,
+        sum_trade_duration = sum_trade_duration + excluded.sum_trade_duration
+"""
+
+SQL_DERIVE_DURATION_PATTERNS = """
+    UPDATE duration_patterns SET
+        win_rate = winning_trades * 1.0 / trade_count,
+        avg_profit_pct = sum_profit_pct / n_profit_pct,
+        -- Only trades with a duration are bucketed, so trade_count counts them
+        optimal_exit_timing_minutes = sum_trade_duration / trade_count,
+        analysis_date = CURRENT_TIMESTAMP
+    WHERE pattern_type = 'duration_based' AND pair IS NULL AND strategy IS NULL
+"""
+
+SQL_UPSERT_BOT_HEALTH_METRICS = """
+    INSERT INTO bot_health_metrics (
+        metric_name, metric_value, metric_unit, health_status, 
+        threshold_warning, threshold_critical,
+        last_calculation, analysis_date
+    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT(metric_name) DO UPDATE SET
+        metric_value = excluded.metric_value,
+        metric_unit = excluded.metric_unit,
+        health_status = excluded.health_status,
+        threshold_warning = excluded.threshold_warning,
+        threshold_critical = excluded.threshold_critical,
+        last_calculation = excluded.last_calculation,
+        analysis_date = excluded.analysis_date
+"""
+
+SQL_INSERT_ANALYSIS_SNAPSHOT = """
+    INSERT INTO analysis_snapshots (
+        snapshot_type, records_processed, status, last_trade_id, error_message
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_SELECT_RUNNING_SUMS_FINGERPRINT = """
+    -- Trade count and rows carrying running sums per incremental table;
+    -- the sql/*.sql scripts empty these tables or refill them without sums
+    SELECT 
+        (SELECT TOTAL(trade_count) FROM performance_rankings WHERE ranking_type = 'by_pair'),
+        (SELECT COUNT(sum_profit_pct) FROM performance_rankings WHERE ranking_type = 'by_pair'),
+        (SELECT TOTAL(total_trades) FROM pair_analytics),
+        (SELECT COUNT(sum_profit_pct) FROM pair_analytics),
+        (SELECT TOTAL(total_trades) FROM strategy_performance),
+        (SELECT COUNT(sum_profit_pct) FROM strategy_performance),
+        (SELECT TOTAL(trade_count) FROM timing_analysis WHERE time_category IN ('hourly', 'daily')),
+        (SELECT COUNT(sum_profit_pct) FROM timing_analysis WHERE time_category IN ('hourly', 'daily')),
+        (SELECT TOTAL(trade_count) FROM duration_patterns 
+         WHERE pattern_type = 'duration_based' AND pair IS NULL AND strategy IS NULL),
+        (SELECT COUNT(sum_profit_pct) FROM duration_patterns 
+         WHERE pattern_type = 'duration_based' AND pair IS NULL AND strategy IS NULL)
+"""
+
+SQL_SELECT_WATERMARK_SNAPSHOT = """
+    SELECT id, last_trade_id FROM analysis_snapshots 
+    WHERE status = 'completed' 
+    ORDER BY last_trade_id DESC, id DESC LIMIT 1
+"""
+
 class TradingAnalyticsAutomator:
     def __init__(self, analytics_db_path=None):
         # Use MCP database path if no specific path provided
         if analytics_db_path is None:
             analytics_db_path = os.path.expanduser('~/db_dev/trading_test.db')
         
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required, "
+                f"but Python is linked against SQLite {sqlite3.sqlite_version}"
+            )
+        
         self.analytics_db = analytics_db_path
+        self.conn = self.connect()
+        self.ensure_trade_indexes()
+        self.ensure_analytics_keys()
+        self.reader = self.connect_reader()
         self.last_processed_trade_id = self.get_last_processed_trade_id()
         
+        # Trades at or below last_processed_trade_id that were still open
+        # when we last looked; they are folded in once they close
+        self.pending_trade_ids = set()
+        # Completed snapshot and table contents our running sums were last
+        # committed with
+        self.watermark_snapshot_id = None
+        self.running_sums_fingerprint = None
+        self.rebuild_incremental_analytics()
+        
+        # Set by notify_trades_changed() to wake the automation loop at once
+        self.trades_changed = threading.Event()
+        
         logging.info(f"Initialized TradingAnalyticsAutomator with database: {self.analytics_db}")
         logging.info(f"Last processed trade ID: {self.last_processed_trade_id}")
         
+    def connect(self):
+        """Open the long-lived analytics database connection with tuned pragmas"""
+        # Transactions are managed explicitly with BEGIN IMMEDIATE / COMMIT;
+        # the larger statement cache keeps every category query prepared
+        conn = sqlite3.connect(
+            self.analytics_db,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # Our commits never checkpoint; run_deep_health_check does it hourly
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+        # Keep a cycle's dirty pages in the cache until commit instead of
+        # spilling them to the WAL mid-transaction
+        conn.execute("PRAGMA cache_spill = OFF")
+        # Built-in math functions only exist from SQLite 3.35 and only when
+        # compiled in; the volatility and consistency figures need SQRT
+        try:
+            conn.execute("SELECT SQRT(1)")
+        except sqlite3.OperationalError:
+            conn.create_function("SQRT", 1, sql_sqrt, deterministic=True)
+        self.configure_connection(conn)
+        return conn
+    
+    def connect_reader(self):
+        """Open a read-only connection for the trades reads done outside the write transaction"""
+        # In WAL mode its reads never wait on, or hold up, the bot's writer
+        reader = sqlite3.connect(
+            f"file:{self.analytics_db}?mode=ro",
+            uri=True,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        reader.execute("PRAGMA query_only = ON")
+        self.configure_connection(reader)
+        return reader
+    
+    def configure_connection(self, conn):
+        """Apply the memory pragmas shared by the writer and reader connections"""
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+    
+    def close(self):
+        """Close the analytics database connections"""
+        self.reader.close()
+        self.conn.close()
+    
+    def ensure_trade_indexes(self):
+        """Create the trades indexes used by the category queries and refresh planner stats"""
+        try:
+            # Partial on closed trades, so the bot's updates to open trades
+            # never touch them; both carry is_open as well because SQLite
+            # only treats an index as covering when it holds every column the
+            # query names, including the partial predicate's. Lookups by
+            # trade_id need none: it is the rowid
+            
+            # Covers the by-pair stop-loss aggregation
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_trades_closed_pair 
+                ON trades(pair, stop_loss_pct, exit_reason, profit_pct, is_open) WHERE is_open = 0
+            """)
+            # Covers the close-ordered series behind the overall aggregates
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_trades_closed_date 
+                ON trades(close_date, trade_id, profit_pct, profit_abs, trade_duration, exit_reason, is_open)
+                WHERE is_open = 0
+            """)
+            
+            self.conn.execute("ANALYZE trades")
+            self.conn.execute("PRAGMA optimize")
+        except Exception as e:
+            logging.warning(f"Could not create trades indexes: {e}")
+    
+    def ensure_analytics_keys(self):
+        """Create unique indexes on the natural key of every row the automation writes, and the snapshot index"""
+        # Partial indexes because the grouping columns the automation leaves
+        # NULL would otherwise never collide in a plain UNIQUE constraint
+        keys = [
+            ('ux_performance_rankings_key', 'performance_rankings',
+             ('ranking_type', 'entity_name', 'entity_type'), None),
+            ('ux_risk_metrics_key', 'risk_metrics', ('metric_type',), "entity_name IS NULL"),
+            ('ux_strategy_performance_key', 'strategy_performance', ('strategy_name',), None),
+            ('ux_timing_analysis_key', 'timing_analysis', ('time_category',),
+             "hour_of_day IS NULL AND day_of_week IS NULL AND day_of_month IS NULL AND month_of_year IS NULL"),
+            ('ux_timing_analysis_hour_key', 'timing_analysis', ('time_category', 'hour_of_day'),
+             "day_of_week IS NULL AND day_of_month IS NULL AND month_of_year IS NULL"),
+            ('ux_timing_analysis_day_key', 'timing_analysis', ('time_category', 'day_of_week'),
+             "hour_of_day IS NULL AND day_of_month IS NULL AND month_of_year IS NULL"),
+            ('ux_pair_analytics_key', 'pair_analytics', ('pair',), None),
+            ('ux_stop_loss_analytics_key', 'stop_loss_analytics', ('analysis_type', 'pair'), "strategy IS NULL"),
+            ('ux_duration_patterns_key', 'duration_patterns',
+             ('pattern_type', 'duration_category'), "pair IS NULL AND strategy IS NULL"),
+            ('ux_bot_health_metrics_key', 'bot_health_metrics', ('metric_name',), None),
+        ]
+        for name, table, columns, where in keys:
+            try:
+                if where is None and self.has_unique_key(table, columns):
+                    continue
+                sql = f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+                if where:
+                    sql += f" WHERE {where}"
+                self.conn.execute(sql)
+            except Exception as e:
+                logging.warning(f"Could not create unique key on {table}: {e}")
+        
+        try:
+            # Turns the watermark lookups into a single index seek however
+            # long the snapshot history gets
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_analysis_snapshots_status_trade 
+                ON analysis_snapshots (status, last_trade_id)
+            """)
+        except Exception as e:
+            logging.warning(f"Could not create analysis_snapshots index: {e}")
+    
+    def has_unique_key(self, table, columns):
+        """Check whether a table already has a full UNIQUE index on exactly these columns"""
+        for _, name, unique, _, partial in self.conn.execute(f"PRAGMA index_list({table})").fetchall():
+            if unique and not partial:
+                indexed = tuple(row[2] for row in self.conn.execute(f"PRAGMA index_info({name})"))
+                if indexed == columns:
+                    return True
+        return False
+    
     def get_last_processed_trade_id(self):
         """Get the ID of the last processed trade from analysis_snapshots"""
         try:
-            with sqlite3.connect(self.analytics_db) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT MAX(last_trade_id) FROM analysis_snapshots WHERE status = 'completed'")
-                result = cursor.fetchone()
-                if result and result[0]:
-                    return result[0]
-                else:
-                    # If no snapshots exist, start from 0 to process all trades
-                    return 0
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT MAX(last_trade_id) FROM analysis_snapshots WHERE status = 'completed'")
+            result = cursor.fetchone()
+            if result and result[0]:
+                return result[0]
+            else:
+                # If no snapshots exist, start from 0 to process all trades
+                return 0
         except Exception as e:
             logging.warning(f"Could not get last processed trade ID: {e}")
             return 0
     
+    def ensure_incremental_columns(self, conn):
+        """Add the running-sum columns used by the incremental categories"""
+        for table, columns in INCREMENTAL_STATE_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    
+    def rebuild_incremental_analytics(self):
+        """Rebuild the incremental categories up to the last processed trade"""
+        conn = self.conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            
+            # Read the watermark under the write lock, so no other automator
+            # can move it while the running sums are rebuilt
+            _, last_trade_id = self.get_watermark_snapshot(conn)
+            staged_count = self.refold_running_sums(conn, last_trade_id)
+            
+            # A completed snapshot at the same watermark tells any other
+            # automator on this database that the running sums were rewritten
+            cursor = conn.execute(SQL_INSERT_ANALYSIS_SNAPSHOT, (
+                'incremental_rebuild', staged_count, 'completed', last_trade_id, None
+            ))
+            
+            fingerprint = self.get_running_sums_fingerprint(conn)
+            
+            self.drop_staged_trades(conn)
+            conn.commit()
+            self.watermark_snapshot_id = cursor.lastrowid
+            self.running_sums_fingerprint = fingerprint
+            
+        except Exception as e:
+            conn.rollback()
+            logging.warning(f"Could not rebuild incremental analytics, retrying on the next cycle: {e}")
+            # Without a snapshot id the next cycle refolds the running sums;
+            # until then watch the open trades below the watermark, so one
+            # closing is enough to start that cycle
+            try:
+                self.pending_trade_ids = self.get_pending_trade_ids(
+                    self.reader, 0, self.last_processed_trade_id)
+            except Exception as e:
+                logging.warning(f"Could not read pending trades: {e}")
+    
+    def refold_running_sums(self, conn, last_trade_id):
+        """Empty the running sums and fold in every closed trade up to last_trade_id"""
+        self.ensure_incremental_columns(conn)
+        
+        conn.execute("DELETE FROM performance_rankings WHERE ranking_type = 'by_pair'")
+        conn.execute("DELETE FROM pair_analytics")
+        conn.execute("DELETE FROM strategy_performance")
+        conn.execute("DELETE FROM timing_analysis WHERE time_category IN ('hourly', 'daily')")
+        conn.execute("""
+            DELETE FROM duration_patterns 
+            WHERE pattern_type = 'duration_based' AND pair IS NULL AND strategy IS NULL
+        """)
+        
+        # Pending trades of the old watermark may lie above the new one
+        self.pending_trade_ids = set()
+        staged_count = self.stage_new_trades(conn, 0, last_trade_id)
+        self.update_performance_rankings(conn)
+        self.update_pair_analytics(conn)
+        self.update_strategy_performance(conn)
+        self.update_timing_analysis(conn)
+        self.update_duration_patterns(conn)
+        # Cycles only refresh the pairs they touch, so bring every pair current here
+        self.update_stop_loss_analytics(conn)
+        
+        self.pending_trade_ids = self.get_pending_trade_ids(conn, 0, last_trade_id)
+        self.last_processed_trade_id = last_trade_id
+        return staged_count
+    
+    def new_trades_filter(self, from_trade_id, to_trade_id=None):
+        """Build the WHERE clause selecting trades not yet folded into the analytics"""
+        if to_trade_id is None:
+            clause, params = "trade_id > ?", (from_trade_id,)
+        else:
+            clause, params = "(trade_id > ? AND trade_id <= ?)", (from_trade_id, to_trade_id)
+        # Even an empty IN () branch stops SQLite from seeking the rowid
+        # range, so it is only added when there are pending trades
+        if self.pending_trade_ids:
+            placeholders = ','.join('?' * len(self.pending_trade_ids))
+            clause = f"({clause} OR trade_id IN ({placeholders}))"
+            params += tuple(sorted(self.pending_trade_ids))
+        return clause, params
+    
+    def stage_new_trades(self, conn, from_trade_id, to_trade_id):
+        """Copy the closed trades of this cycle into the new_closed_trades temp table"""
+        # The merging update_* methods read the staged tables, which only
+        # exist inside the write transaction: they are dropped before commit
+        # and a rollback discards them with everything else
+        clause, params = self.new_trades_filter(from_trade_id, to_trade_id)
+        
+        conn.execute("DROP TABLE IF EXISTS temp.new_closed_trades")
+        conn.execute(f"""
+            CREATE TEMP TABLE new_closed_trades AS
+            SELECT 
+                trade_id, pair, base_currency, quote_currency, strategy,
+                profit_pct, profit_abs, profit_ratio, trade_duration, stake_amount,
+                -- Integer time keys parsed once per staged trade, not per category
+                CAST(strftime('%H', open_date) AS INTEGER) as hour_of_day,
+                CAST(strftime('%w', open_date) AS INTEGER) as day_of_week,
+                -- Classified once here rather than in every category's aggregate
+                CASE WHEN profit_pct > 0 THEN 1 ELSE 0 END as is_win
+            FROM trades 
+            WHERE is_open = 0 AND {clause}
+        """, params)
+        
+        self.stage_pair_deltas(conn)
+        return conn.execute("SELECT COUNT(*) FROM new_closed_trades").fetchone()[0]
+    
+    def stage_pair_deltas(self, conn):
+        """Aggregate this cycle's trades per pair once for pair analytics and rankings"""
+        conn.execute("DROP TABLE IF EXISTS temp.new_pair_deltas")
+        conn.execute(SQL_STAGE_PAIR_DELTAS)
+    
+    def drop_staged_trades(self, conn):
+        """Drop the staged tables so no later call can merge this cycle's trades again"""
+        conn.execute("DROP TABLE IF EXISTS temp.new_pair_deltas")
+        conn.execute("DROP TABLE IF EXISTS temp.new_closed_trades")
+    
+    def get_pending_trade_ids(self, conn, from_trade_id, to_trade_id):
+        """Get the trades in this cycle's range that are still open"""
+        clause, params = self.new_trades_filter(from_trade_id, to_trade_id)
+        cursor = conn.execute(f"SELECT trade_id FROM trades WHERE is_open != 0 AND {clause}", params)
+        return {row[0] for row in cursor.fetchall()}
+    
+    def get_watermark_snapshot(self, conn):
+        """Get the id and last trade ID of the completed snapshot holding the watermark"""
+        # The id also tells apart snapshots written at the same watermark
+        return conn.execute(SQL_SELECT_WATERMARK_SNAPSHOT).fetchone() or (None, 0)
+    
+    def get_running_sums_fingerprint(self, conn):
+        """Summarize the incremental tables to notice changes made behind our back"""
+        return conn.execute(SQL_SELECT_RUNNING_SUMS_FINGERPRINT).fetchone()
+    
     def check_for_new_trades(self):
         """Check if there are new completed trades to process"""
         try:
-            with sqlite3.connect(self.analytics_db) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) FROM trades 
-                    WHERE trade_id > ? AND is_open = 0
-                """, (self.last_processed_trade_id,))
-                
-                count = cursor.fetchone()[0]
-                
-                if count > 0:
-                    logging.info(f"Found {count} new completed trades")
-                    self.process_new_trades(count)
-                    return True
-                return False
-                
+            # A rowid seek past the watermark, plus a rowid probe per trade
+            # below it that was still open when there are any
+            clause, params = self.new_trades_filter(self.last_processed_trade_id)
+            trade_count, max_trade_id = self.reader.execute(
+                f"SELECT COUNT(*), MAX(trade_id) FROM trades WHERE is_open = 0 AND {clause}", params
+            ).fetchone()
+            
+            if trade_count:
+                self.process_new_trades(max_trade_id=max_trade_id, trade_count=trade_count)
+                return True
+            return False
+            
         except Exception as e:
             logging.error(f"Error checking for new trades: {e}")
             return False
     
-    def process_new_trades(self, trade_count):
+    def process_new_trades(self, *, max_trade_id=None, trade_count=None):
         """Process new trades and update all analytics"""
+        conn = self.conn
         try:
-            with sqlite3.connect(self.analytics_db) as conn:
-                # Get the maximum trade_id to update our tracking
-                cursor = conn.cursor()
-                cursor.execute("SELECT MAX(trade_id) FROM trades WHERE is_open = 0")
-                max_trade_id = cursor.fetchone()[0]
+            # Read from one snapshot on the reader so the full-table aggregates
+            # run before the write lock is taken
+            reader = self.reader
+            reader.execute("BEGIN")
+            try:
+                # Get the maximum trade_id to update our tracking, unless the
+                # caller already looked it up along with the count
+                if max_trade_id is None:
+                    max_trade_id = reader.execute(
+                        "SELECT MAX(trade_id) FROM trades WHERE is_open = 0"
+                    ).fetchone()[0]
+                
+                # When only pending trades closed the maximum can lie below
+                # the watermark, which never moves back
+                max_trade_id = max(max_trade_id or 0, self.last_processed_trade_id)
+                
+                # The writer compares this count with what it actually stages
+                if trade_count is None:
+                    clause, params = self.new_trades_filter(self.last_processed_trade_id, max_trade_id)
+                    trade_count = reader.execute(
+                        f"SELECT COUNT(*) FROM trades WHERE is_open = 0 AND {clause}", params
+                    ).fetchone()[0]
+                
+                # Overall aggregates shared by the risk, timing and health categories
+                stats = self.get_overall_stats(reader)
+            finally:
+                reader.rollback()
+            logging.info(f"Found {trade_count} new completed trades")
+            
+            try:
+                # Run every category update in one write transaction
+                conn.execute("BEGIN IMMEDIATE")
+                
+                # Another automator on this database, such as a one-shot run,
+                # may have committed since our last cycle, a sql/*.sql script
+                # may have reset the tables, or the startup rebuild failed;
+                # refold from the stored watermark instead of adding to
+                # running sums we did not write
+                snapshot_id, last_trade_id = self.get_watermark_snapshot(conn)
+                if (self.watermark_snapshot_id is None or
+                        snapshot_id != self.watermark_snapshot_id or
+                        self.get_running_sums_fingerprint(conn) != self.running_sums_fingerprint):
+                    logging.warning("Running sums were not committed by this automator, rebuilding them")
+                    self.refold_running_sums(conn, last_trade_id)
+                    max_trade_id = max(max_trade_id, last_trade_id)
+                
+                # Collect the trades closed since the last cycle
+                staged_count = self.stage_new_trades(conn, self.last_processed_trade_id, max_trade_id)
+                
+                # A trade that closed after the reader's snapshot is staged
+                # here too; the shared aggregates must then include it
+                if staged_count != trade_count:
+                    trade_count = staged_count
+                    stats = self.get_overall_stats(conn)
+                
+                # Update all 8 analytics categories
+                self.update_performance_rankings(conn)
+                self.update_risk_metrics(conn, stats)
+                self.update_strategy_performance(conn)
+                self.update_timing_analysis(conn, stats)
+                self.update_pair_analytics(conn)
+                self.update_stop_loss_analytics(conn)
+                self.update_duration_patterns(conn)
+                self.update_bot_health_metrics(conn, stats)
+                
+                pending_trade_ids = self.get_pending_trade_ids(
+                    conn, self.last_processed_trade_id, max_trade_id)
+                
+                # Record the completed snapshot in the same commit as the
+                # analytics, so the watermark and running sums never diverge
+                cursor = conn.execute(SQL_INSERT_ANALYSIS_SNAPSHOT, (
+                    'automated_analysis', trade_count, 'completed', max_trade_id, None
+                ))
+                
+                fingerprint = self.get_running_sums_fingerprint(conn)
+                
+                self.drop_staged_trades(conn)
+                conn.commit()
                 
-                # Start analysis snapshot
-                cursor.execute("""
-                    INSERT INTO analysis_snapshots (
-                        snapshot_type, records_processed, status, last_trade_id
-                    ) VALUES (?, ?, ?, ?)
-                """, ('automated_analysis', trade_count, 'processing', max_trade_id))
+                # Update last processed ID
+                self.last_processed_trade_id = max_trade_id
+                self.pending_trade_ids = pending_trade_ids
+                self.watermark_snapshot_id = cursor.lastrowid
+                self.running_sums_fingerprint = fingerprint
+                logging.info(f"Successfully processed {trade_count} trades")
                 
-                snapshot_id = cursor.lastrowid
+                # Keep planner statistics current as the trades table grows
+                conn.execute("PRAGMA optimize")
+                
+            except Exception as e:
+                # Discard the partial update so running sums are never
+                # applied twice, then record the failed snapshot (autocommitted)
+                conn.rollback()
+                conn.execute(SQL_INSERT_ANALYSIS_SNAPSHOT, (
+                    'automated_analysis', trade_count, 'failed', max_trade_id, str(e)
+                ))
+                raise
                 
-                try:
-                    # Update all 8 analytics categories
-                    self.update_performance_rankings(conn)
-                    self.update_risk_metrics(conn)
-                    self.update_strategy_performance(conn)
-                    self.update_timing_analysis(conn)
-                    self.update_pair_analytics(conn)
-                    self.update_stop_loss_analytics(conn)
-                    self.update_duration_patterns(conn)
-                    self.update_bot_health_metrics(conn)
-                    
-                    # Update last processed ID
-                    self.last_processed_trade_id = max_trade_id
-                    
-                    # Mark snapshot as completed
-                    cursor.execute("""
-                        UPDATE analysis_snapshots 
-                        SET status = 'completed', last_trade_id = ?
-                        WHERE id = ?
-                    """, (self.last_processed_trade_id, snapshot_id))
-                    
-                    conn.commit()
-                    logging.info(f"Successfully processed {trade_count} trades")
-                    
-                except Exception as e:
-                    # Mark snapshot as failed
-                    cursor.execute("""
-                        UPDATE analysis_snapshots 
-                        SET status = 'failed', error_message = ?
-                        WHERE id = ?
-                    """, (str(e), snapshot_id))
-                    conn.commit()
-                    raise
-                    
         except Exception as e:
             logging.error(f"Error processing new trades: {e}")
     
+    def get_overall_stats(self, conn):
+        """Aggregate all closed trades once for the overall risk, timing and health metrics"""
+        # One ordered scan feeds both the plain aggregates and the return
+        # series behind the Sharpe ratio and drawdown; NULLs arrive as NaN
+        # Stream the rows straight into a (n, 4) array, no intermediate list
+        series = np.fromiter(conn.execute(SQL_SELECT_CLOSED_TRADE_SERIES), dtype=np.dtype((float, 4)))
+        profit_pct, profit_abs, trade_duration, is_stop_loss = series.T
+        is_stop_loss = is_stop_loss == 1
+        losses = np.where(profit_abs < 0, -profit_abs, 0.0)
+        
+        stats = {
+            'total_trades': len(series),
+            'win_rate': float((profit_pct > 0).mean()) if len(series) else None,
+            'avg_profit_pct': self.nan_aggregate(np.mean, profit_pct),
+            'total_profit_abs': self.nan_aggregate(np.sum, profit_abs),
+            'worst_trade_pct': self.nan_aggregate(np.min, profit_pct),
+            'best_trade_pct': self.nan_aggregate(np.max, profit_pct),
+            'avg_trade_duration': self.nan_aggregate(np.mean, trade_duration),
+            'sl_triggered_count': int(is_stop_loss.sum()) if len(series) else None,
+            'sl_loss_abs': float(losses[is_stop_loss].sum()) if len(series) else None,
+            'gross_loss_abs': float(losses.sum()) if len(series) else None,
+        }
+        stats.update(self.get_return_stats(profit_pct[~np.isnan(profit_pct)]))
+        return stats
+    
+    def nan_aggregate(self, func, values):
+        """Apply func to the non-NULL values, or return None like SQL when there are none"""
+        values = values[~np.isnan(values)]
+        return float(func(values)) if len(values) else None
+    
+    def get_return_stats(self, returns):
+        """Compute Sharpe ratio and maximum drawdown from per-trade returns"""
+        if len(returns) > 1 and returns.std(ddof=1) > 0:
+            # Per-trade Sharpe ratio (not annualized)
+            sharpe_ratio = float(returns.mean() / returns.std(ddof=1))
+        else:
+            sharpe_ratio = 0.0
+        
+        return {'sharpe_ratio': sharpe_ratio, 'max_drawdown_pct': float(max_drawdown(returns))}
+    
     def update_performance_rankings(self, conn):
         """Update performance rankings for all pairs"""
-        # Clear existing rankings and recalculate
-        conn.execute("DELETE FROM performance_rankings WHERE ranking_type = 'by_pair'")
+        # Merge this cycle's per-pair deltas into the running sums
+        conn.execute(SQL_MERGE_PERFORMANCE_RANKINGS)
         
-        conn.execute("""
-            INSERT INTO performance_rankings (
-                ranking_type, entity_name, entity_type, profit_ratio, 
-                profit_pct, profit_abs, trade_count, win_rate, 
-                avg_duration_minutes, max_profit_pct, min_profit_pct,
-                total_volume, rank_position, analysis_date
-            )
-            SELECT 
-                'by_pair' as ranking_type,
-                pair as entity_name,
-                'trading_pair' as entity_type,
-                AVG(profit_ratio) as profit_ratio,
-                AVG(profit_pct) as profit_pct,
-                SUM(profit_abs) as profit_abs,
-                COUNT(*) as trade_count,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(trade_duration) as avg_duration_minutes,
-                MAX(profit_pct) as max_profit_pct,
-                MIN(profit_pct) as min_profit_pct,
-                SUM(stake_amount) as total_volume,
-                ROW_NUMBER() OVER (ORDER BY AVG(profit_pct) DESC) as rank_position,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0 
-            GROUP BY pair
-        """)
+        # Derive averages from the running sums of the pairs touched this cycle
+        conn.execute(SQL_DERIVE_PERFORMANCE_RANKINGS)
+        
+        # Re-rank over the per-pair rows rather than the trades table,
+        # touching only the rows whose position actually moved
+        conn.execute(SQL_RANK_PERFORMANCE_RANKINGS)
         logging.info("Updated performance rankings")
     
-    def update_risk_metrics(self, conn):
+    def update_risk_metrics(self, conn, stats=None):
         """Update risk management metrics"""
-        # Clear existing metrics and recalculate
-        conn.execute("DELETE FROM risk_metrics WHERE metric_type = 'overall'")
+        if stats is None:
+            stats = self.get_overall_stats(conn)
         
-        conn.execute("""
-            INSERT INTO risk_metrics (
-                metric_type, stop_loss_triggered_count, 
-                stop_loss_effectiveness_pct, sharpe_ratio,
-                max_drawdown_pct, analysis_date
-            )
-            SELECT 
-                'overall' as metric_type,
-                SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END) as sl_triggered,
-                CASE 
-                    WHEN SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END) > 0 
-                    THEN (SUM(CASE WHEN exit_reason = 'stop_loss' AND profit_abs < 0 THEN ABS(profit_abs) ELSE 0 END) / 
-                          NULLIF(SUM(CASE WHEN profit_abs < 0 THEN ABS(profit_abs) ELSE 0 END), 0) * 100)
-                    ELSE 0 
-                END as sl_effectiveness,
-                0.0 as sharpe_ratio,  -- Simplified for now
-                MIN(profit_pct) as max_drawdown_pct,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades WHERE is_open = 0
-        """)
+        if stats['sl_triggered_count']:
+            sl_effectiveness = (stats['sl_loss_abs'] / stats['gross_loss_abs'] * 100
+                                if stats['gross_loss_abs'] else None)
+        else:
+            sl_effectiveness = 0
+        
+        # Recalculate in place so the row keeps its page
+        conn.execute(SQL_UPSERT_RISK_METRICS, (
+            stats['sl_triggered_count'],
+            sl_effectiveness,
+            stats['sharpe_ratio'],
+            stats['max_drawdown_pct']
+        ))
         logging.info("Updated risk metrics")
     
     def update_strategy_performance(self, conn):
         """Update strategy comparison metrics"""
-        # Clear existing data and recalculate
-        conn.execute("DELETE FROM strategy_performance")
+        # Merge this cycle's trades into the running sums per strategy
+        conn.execute(SQL_MERGE_STRATEGY_PERFORMANCE)
         
-        conn.execute("""
-            INSERT INTO strategy_performance (
-                strategy_name, total_trades, winning_trades, losing_trades,
-                win_rate, avg_profit_pct, total_profit_abs, profit_factor,
-                expectancy, best_trade_pct, worst_trade_pct, 
-                consistency_score, avg_trade_duration_minutes, analysis_date
-            )
-            SELECT 
-                strategy as strategy_name,
-                COUNT(*) as total_trades,
-                SUM(CASE WHEN profit_pct > 0 THEN 1 ELSE 0 END) as winning_trades,
-                SUM(CASE WHEN profit_pct <= 0 THEN 1 ELSE 0 END) as losing_trades,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(profit_pct) as avg_profit_pct,
-                SUM(profit_abs) as total_profit_abs,
-                CASE 
-                    WHEN SUM(CASE WHEN profit_abs < 0 THEN ABS(profit_abs) ELSE 0 END) > 0
-                    THEN SUM(CASE WHEN profit_abs > 0 THEN profit_abs ELSE 0 END) / 
-                         SUM(CASE WHEN profit_abs < 0 THEN ABS(profit_abs) ELSE 0 END)
-                    ELSE 0
-                END as profit_factor,
-                AVG(profit_pct) * AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as expectancy,
-                MAX(profit_pct) as best_trade_pct,
-                MIN(profit_pct) as worst_trade_pct,
-                0.5 as consistency_score,  -- Simplified calculation
-                AVG(trade_duration) as avg_trade_duration_minutes,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0 
-            GROUP BY strategy
-        """)
+        # Derive ratios from the running sums of the strategies touched this cycle
+        conn.execute(SQL_DERIVE_STRATEGY_PERFORMANCE)
         logging.info("Updated strategy performance")
     
-    def update_timing_analysis(self, conn):
+    def update_timing_analysis(self, conn, stats=None):
         """Update timing analysis with the actual table structure"""
-        # Clear existing data and recalculate
-        conn.execute("DELETE FROM timing_analysis")
+        if stats is None:
+            stats = self.get_overall_stats(conn)
         
-        # Get hourly performance data
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                strftime('%H', open_date) as hour,
-                COUNT(*) as trade_count,
-                AVG(profit_pct) as avg_profit_pct,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(trade_duration) as avg_duration
-            FROM trades 
-            WHERE is_open = 0 AND open_date IS NOT NULL
-            GROUP BY strftime('%H', open_date)
-            ORDER BY avg_profit_pct DESC
-        """)
+        # Merge this cycle's trades into the running sums per hour and per
+        # day of week, then read the best/worst hour and the weekend/weekday
+        # split from those 31 rows instead of the trades table
+        conn.execute(SQL_MERGE_TIMING_HOURLY)
+        conn.execute(SQL_MERGE_TIMING_DAILY)
+        conn.execute(SQL_DERIVE_TIMING_BREAKDOWNS)
         
-        hourly_data = cursor.fetchall()
-        if hourly_data:
-            best_hour = int(hourly_data[0][0]) if hourly_data[0][0] else 0
-            worst_hour = int(hourly_data[-1][0]) if hourly_data[-1][0] else 0
-            
-            # Calculate weekend vs weekday performance
-            cursor.execute("""
-                SELECT 
-                    CASE WHEN strftime('%w', open_date) IN ('0', '6') THEN 'weekend' ELSE 'weekday' END as period_type,
-                    AVG(profit_pct) as avg_profit_pct
-                FROM trades 
-                WHERE is_open = 0 AND open_date IS NOT NULL
-                GROUP BY CASE WHEN strftime('%w', open_date) IN ('0', '6') THEN 'weekend' ELSE 'weekday' END
-            """)
-            
-            period_data = cursor.fetchall()
-            weekend_perf = next((row[1] for row in period_data if row[0] == 'weekend'), 0.0)
-            weekday_perf = next((row[1] for row in period_data if row[0] == 'weekday'), 0.0)
-        else:
-            best_hour = worst_hour = 0
-            weekend_perf = weekday_perf = 0.0
+        cursor = conn.cursor()
+        cursor.execute(SQL_SELECT_TIMING_SUMMARY)
+        best_hour, worst_hour, weekend_perf, weekday_perf = cursor.fetchone()
         
         # Insert the timing analysis
-        conn.execute("""
-            INSERT INTO timing_analysis (
-                time_category, trade_count, win_rate, avg_profit_pct,
-                total_profit_abs, best_performance_hour, worst_performance_hour,
-                weekend_performance_pct, weekday_performance_pct,
-                duration_minutes_avg, analysis_date
-            )
-            SELECT 
-                'overall' as time_category,
-                COUNT(*) as trade_count,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(profit_pct) as avg_profit_pct,
-                SUM(profit_abs) as total_profit_abs,
-                ? as best_performance_hour,
-                ? as worst_performance_hour,
-                ? as weekend_performance_pct,
-                ? as weekday_performance_pct,
-                AVG(trade_duration) as duration_minutes_avg,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0
-        """, (best_hour, worst_hour, weekend_perf, weekday_perf))
+        conn.execute(SQL_UPSERT_TIMING_ANALYSIS, (
+            stats['total_trades'], stats['win_rate'], stats['avg_profit_pct'],
+            stats['total_profit_abs'], best_hour, worst_hour,
+            weekend_perf, weekday_perf, stats['avg_trade_duration']
+        ))
         
         logging.info("Updated timing analysis")
     
     def update_pair_analytics(self, conn):
         """Update individual pair analytics"""
-        # Clear existing data and recalculate
-        conn.execute("DELETE FROM pair_analytics")
+        # Merge this cycle's per-pair deltas into the running sums
+        conn.execute(SQL_MERGE_PAIR_ANALYTICS)
         
-        conn.execute("""
-            INSERT INTO pair_analytics (
-                pair, base_currency, quote_currency, total_trades, 
-                winning_trades, losing_trades, win_rate, avg_profit_pct,
-                total_profit_abs, avg_trade_duration_minutes, price_volatility_pct,
-                analysis_date
-            )
-            SELECT 
-                pair,
-                base_currency,
-                quote_currency,
-                COUNT(*) as total_trades,
-                SUM(CASE WHEN profit_pct > 0 THEN 1 ELSE 0 END) as winning_trades,
-                SUM(CASE WHEN profit_pct <= 0 THEN 1 ELSE 0 END) as losing_trades,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(profit_pct) as avg_profit_pct,
-                SUM(profit_abs) as total_profit_abs,
-                AVG(trade_duration) as avg_trade_duration_minutes,
-                CASE 
-                    WHEN COUNT(*) > 1
-                    THEN SQRT(AVG(profit_pct * profit_pct) - AVG(profit_pct) * AVG(profit_pct))
-                    ELSE 0
-                END as price_volatility_pct,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0 
-            GROUP BY pair, base_currency, quote_currency
-        """)
+        # Derive averages and volatility from the running sums of the pairs
+        # touched this cycle
+        conn.execute(SQL_DERIVE_PAIR_ANALYTICS)
         logging.info("Updated pair analytics")
     
     def update_stop_loss_analytics(self, conn):
         """Update stop loss effectiveness analysis"""
-        # Clear existing data and recalculate
-        conn.execute("DELETE FROM stop_loss_analytics")
-        
-        conn.execute("""
-            INSERT INTO stop_loss_analytics (
-                analysis_type, pair, stop_loss_level_pct, total_trades_with_sl,
-                sl_triggered_count, sl_effectiveness_pct, 
-                avg_loss_when_triggered_pct, avg_profit_when_not_triggered_pct,
-                analysis_date
-            )
-            SELECT 
-                'by_pair' as analysis_type,
-                pair,
-                AVG(stop_loss_pct) as stop_loss_level_pct,
-                COUNT(*) as total_trades_with_sl,
-                SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END) as sl_triggered_count,
-                CASE 
-                    WHEN SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END) > 0
-                    THEN (SUM(CASE WHEN exit_reason = 'stop_loss' AND profit_pct > -10 THEN 1 ELSE 0 END) * 1.0 / 
-                          SUM(CASE WHEN exit_reason = 'stop_loss' THEN 1 ELSE 0 END)) * 100
-                    ELSE 0
-                END as sl_effectiveness_pct,
-                AVG(CASE WHEN exit_reason = 'stop_loss' THEN profit_pct ELSE NULL END) as avg_loss_when_triggered_pct,
-                AVG(CASE WHEN exit_reason != 'stop_loss' THEN profit_pct ELSE NULL END) as avg_profit_when_not_triggered_pct,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0 AND stop_loss_pct IS NOT NULL
-            GROUP BY pair
-        """)
+        # Recalculate in place only the pairs that closed trades this cycle;
+        # the rows of every other pair are already current
+        conn.execute(SQL_UPSERT_STOP_LOSS_ANALYTICS)
         logging.info("Updated stop loss analytics")
     
     def update_duration_patterns(self, conn):
         """Update trade duration pattern analysis"""
-        # Clear existing data and recalculate
-        conn.execute("DELETE FROM duration_patterns")
+        # Merge this cycle's trades into the running sums per duration
+        # category; the bucket CASE is evaluated once per trade in the CTE
+        conn.execute(SQL_MERGE_DURATION_PATTERNS)
         
-        conn.execute("""
-            INSERT INTO duration_patterns (
-                pattern_type, duration_category, min_duration_minutes, 
-                max_duration_minutes, trade_count, win_rate, avg_profit_pct,
-                total_profit_abs, optimal_exit_timing_minutes, analysis_date
-            )
-            SELECT 
-                'duration_based' as pattern_type,
-                CASE 
-                    WHEN trade_duration <= 60 THEN 'scalp'
-                    WHEN trade_duration <= 480 THEN 'short_term'  
-                    WHEN trade_duration <= 1440 THEN 'day_trade'
-                    ELSE 'swing_trade'
-                END as duration_category,
-                MIN(trade_duration) as min_duration_minutes,
-                MAX(trade_duration) as max_duration_minutes,
-                COUNT(*) as trade_count,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(profit_pct) as avg_profit_pct,
-                SUM(profit_abs) as total_profit_abs,
-                AVG(trade_duration) as optimal_exit_timing_minutes,
-                CURRENT_TIMESTAMP as analysis_date
-            FROM trades 
-            WHERE is_open = 0 AND trade_duration IS NOT NULL
-            GROUP BY 
-                CASE 
-                    WHEN trade_duration <= 60 THEN 'scalp'
-                    WHEN trade_duration <= 480 THEN 'short_term'  
-                    WHEN trade_duration <= 1440 THEN 'day_trade'
-                    ELSE 'swing_trade'
-                END
-        """)
+        # Derive averages from the running sums
+        conn.execute(SQL_DERIVE_DURATION_PATTERNS)
         logging.info("Updated duration patterns")
     
-    def update_bot_health_metrics(self, conn):
+    def update_bot_health_metrics(self, conn, stats=None):
         """Update overall bot health metrics"""
-        # Clear existing metrics
-        conn.execute("DELETE FROM bot_health_metrics")
-        
-        # Calculate current health metrics
-        cursor = conn.cursor()
+        if stats is None:
+            stats = self.get_overall_stats(conn)
         
-        # Get overall stats
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_trades,
-                AVG(CASE WHEN profit_pct > 0 THEN 1.0 ELSE 0.0 END) as win_rate,
-                AVG(profit_pct) as avg_profit_pct,
-                SUM(profit_abs) as total_profit,
-                MIN(profit_pct) as worst_loss,
-                MAX(profit_pct) as best_win
-            FROM trades WHERE is_open = 0
-        """)
-        stats = cursor.fetchone()
-        
-        if stats and stats[0] > 0:
-            total_trades, win_rate, avg_profit_pct, total_profit, worst_loss, best_win = stats
+        if stats['total_trades'] > 0:
+            total_trades = stats['total_trades']
+            win_rate = stats['win_rate']
+            avg_profit_pct = stats['avg_profit_pct']
+            total_profit = stats['total_profit_abs']
+            worst_loss = stats['worst_trade_pct']
+            best_win = stats['best_trade_pct']
             
             # Determine health status
             if win_rate >= 0.7 and avg_profit_pct >= 0.5:
@@ -441,48 +1276,125 @@ class TradingAnalyticsAutomator:
                 ('best_win', best_win, '%', 'HEALTHY', None, None)
             ]
             
-            for metric_name, metric_value, unit, health_status, threshold_warning, threshold_critical in health_metrics:
-                conn.execute("""
-                    INSERT INTO bot_health_metrics (
-                        metric_name, metric_value, metric_unit, health_status, 
-                        threshold_warning, threshold_critical,
-                        last_calculation, analysis_date
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                """, (metric_name, metric_value, unit, health_status, 
-                      threshold_warning, threshold_critical))
+            conn.executemany(SQL_UPSERT_BOT_HEALTH_METRICS, health_metrics)
             
         logging.info("Updated bot health metrics")
     
-    def run_scheduled_analysis(self):
+    def run_scheduled_analysis(self, quiet=False):
         """Run the complete analysis cycle"""
-        logging.info("Starting scheduled analysis cycle...")
+        # Quiet runs log at DEBUG unless they process trades: most commits
+        # the bot makes only update open trades
+        log_level = logging.DEBUG if quiet else logging.INFO
+        logging.log(log_level, "Starting scheduled analysis cycle...")
         
         if self.check_for_new_trades():
             logging.info("Analysis completed - new trades processed")
         else:
-            logging.info("Analysis completed - no new trades")
+            logging.log(log_level, "Analysis completed - no new trades")
+    
+    def run_deep_health_check(self):
+        """Refresh planner statistics and checkpoint and truncate the WAL"""
+        logging.info("Running deep health check...")
+        try:
+            self.conn.execute("ANALYZE trades")
+            self.conn.execute("PRAGMA optimize")
+            busy, wal_pages, checkpointed = self.conn.execute(
+                "PRAGMA wal_checkpoint(TRUNCATE)"
+            ).fetchone()
+            if busy:
+                logging.warning(f"WAL checkpoint incomplete - checkpointed {checkpointed} of {wal_pages} pages")
+            else:
+                logging.info(f"Deep health check completed - checkpointed {checkpointed} of {wal_pages} WAL pages")
+            
+        except Exception as e:
+            logging.error(f"Deep health check failed: {e}")
+    
+    def prune_analysis_snapshots(self):
+        """Delete analysis snapshots beyond the retention window"""
+        try:
+            # Never drop the completed snapshot that holds the watermark
+            cursor = self.conn.execute("""
+                DELETE FROM analysis_snapshots 
+                WHERE id <= (
+                    SELECT id FROM analysis_snapshots 
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                AND id IS NOT (
+                    SELECT id FROM analysis_snapshots 
+                    WHERE status = 'completed' 
+                    ORDER BY last_trade_id DESC LIMIT 1
+                )
+            """, (SNAPSHOT_RETENTION_COUNT,))
+            logging.info(f"Pruned {cursor.rowcount} old analysis snapshots")
+            
+        except Exception as e:
+            logging.error(f"Snapshot pruning failed: {e}")
+    
+    def notify_trades_changed(self):
+        """Wake the automation loop to check for new trades immediately"""
+        self.trades_changed.set()
+    
+    def get_data_version(self):
+        """Get the database data_version, which changes when another connection commits"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
     
     def start_automation(self):
         """Start the automation system"""
         logging.info("Starting Trading Analytics Automation System")
         
-        # Schedule checks every 5 minutes
-        schedule.every(5).minutes.do(self.run_scheduled_analysis)
-        
-        # Schedule full health check every hour
-        schedule.every().hour.do(self.run_scheduled_analysis)
+        # Recurring jobs kept in a heap ordered by their next monotonic due
+        # time; the index breaks ties so callbacks are never compared
+        now = time.monotonic()
+        jobs = [
+            (now + period, index, period, job)
+            for index, (period, job) in enumerate([
+                # Fallback check every 5 minutes
+                (ANALYSIS_INTERVAL_SECONDS, self.run_scheduled_analysis),
+                # Database maintenance every hour
+                (HEALTH_CHECK_INTERVAL_SECONDS, self.run_deep_health_check),
+                # Keep the snapshot history bounded
+                (SNAPSHOT_PRUNE_INTERVAL_SECONDS, self.prune_analysis_snapshots),
+            ])
+        ]
+        heapq.heapify(jobs)
         
         logging.info("Automation scheduled - checking every 5 minutes")
         
         try:
+            # Only query trades once the database has actually been written to
+            last_data_version = self.get_data_version()
+            last_analysis = time.monotonic()
+            
             while True:
-                schedule.run_pending()
-                time.sleep(30)  # Check every 30 seconds for scheduled jobs
+                # Run every job that has come due, rescheduling each from
+                # when it finished so a slow run never piles up repeats
+                while jobs[0][0] <= time.monotonic():
+                    _, index, period, job = heapq.heappop(jobs)
+                    job()
+                    heapq.heappush(jobs, (time.monotonic() + period, index, period, job))
+                
+                # An explicit notification skips the debounce meant for
+                # bursts of commits seen through data_version
+                data_version = self.get_data_version()
+                if self.trades_changed.is_set() or (
+                        data_version != last_data_version and
+                        time.monotonic() - last_analysis >= MIN_ANALYSIS_INTERVAL_SECONDS):
+                    self.trades_changed.clear()
+                    last_data_version = data_version
+                    last_analysis = time.monotonic()
+                    self.run_scheduled_analysis(quiet=True)
+                
+                # Wake for whichever comes first: the next job, the next poll
+                # or a notification
+                idle_seconds = jobs[0][0] - time.monotonic()
+                self.trades_changed.wait(max(0, min(idle_seconds, DATA_VERSION_POLL_SECONDS)))
                 
         except KeyboardInterrupt:
             logging.info("Automation stopped by user")
         except Exception as e:
             logging.error(f"Automation error: {e}")
+        finally:
+            self.close()
 
 def main():
     """Main entry point"""